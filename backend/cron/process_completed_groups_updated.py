@@ -30,7 +30,7 @@ sys.path.insert(0, "..")
 sys.path.insert(0, ".")
 
 from database.connection import get_db
-from services.payment_service import get_payment_service
+from services.payment_service import close_payment_service, get_payment_service
 from services.price_calculator import calculate_current_price
 
 # Импортируем функции уведомлений
@@ -347,8 +347,12 @@ async def process_failed_groups():
 
 async def main():
     """Основная функция."""
-    await process_completed_groups()
-    await process_failed_groups()
+    try:
+        await process_completed_groups()
+        await process_failed_groups()
+    finally:
+        # Закрываем HTTP-клиент ЮKassa до выхода из event loop
+        await close_payment_service()
 
 
 if __name__ == "__main__":
@@ -28,6 +28,7 @@ from fastapi.responses import FileResponse
 # Импортируем наши модули
 from config import settings, validate_config, is_development
 from database.connection import check_connection
+from services.payment_service import close_payment_service
 
 
 # ============================================================
@@ -80,6 +81,9 @@ async def lifespan(app: FastAPI):
     # ===== SHUTDOWN =====
     print("👋 Остановка приложения...")
     # Здесь можно закрыть соединения, сохранить состояние и т.д.
+    
+    # Дописываем в БД webhook'и ЮKassa из очереди и закрываем HTTP-клиент ЮKassa
+    await close_payment_service()
 
 
 # ============================================================
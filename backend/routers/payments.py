@@ -23,6 +23,7 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from typing import Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Header
 from pydantic import BaseModel
 
@@ -176,21 +177,22 @@ async def handle_webhook(
     payment_service = get_payment_service()
     db = get_db()
     
-    # Получаем тело запроса
-    body = await request.body()
-    
-    # Проверяем подпись (если настроен секрет)
+    # Проверяем подпись (если настроен секрет) прямо при чтении тела
     if webhook_signature:
-        is_valid = payment_service.verify_webhook_signature(body, webhook_signature)
+        is_valid, body = await payment_service.verify_webhook_signature_stream(
+            request, webhook_signature
+        )
         if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid webhook signature"
             )
+    else:
+        body = await request.body()
     
-    # Парсим JSON
+    # Парсим JSON из уже прочитанного тела
     try:
-        data = await request.json()
+        data = orjson.loads(body)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -33,14 +33,21 @@
     await service.refund_payment(payment_id="...", amount=19000)
 """
 
+import asyncio
+import base64
 import uuid
 import hashlib
 import hmac
+import random
+import time
+from collections import OrderedDict
 from decimal import Decimal
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, TypedDict
+from fastapi import Request
 from pydantic import BaseModel
 import httpx
+import orjson
 
 import sys
 sys.path.append("..")
@@ -102,6 +109,19 @@ class YooKassaPayment(BaseModel):
         return self.status == "canceled"
 
 
+class PaymentLite(TypedDict, total=False):
+    """
+    Поля ответа ЮKassa, которые читают create/capture/cancel.
+    
+    Обычный dict без валидации — полная модель YooKassaPayment
+    строится только в get_payment.
+    """
+    id: str
+    status: str
+    amount: Dict[str, str]
+    confirmation: Dict[str, str]
+
+
 class PaymentCreateResult(BaseModel):
     """Результат создания платежа."""
     success: bool
@@ -129,6 +149,18 @@ class RefundResult(BaseModel):
     error: Optional[str] = None
 
 
+# ============================================================
+# ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
+# ============================================================
+
+_KOPECK = Decimal("0.01")
+
+
+def _format_amount(amount) -> str:
+    """Сумма в формате API ЮKassa: "19000.00"."""
+    return format(Decimal(str(amount)).quantize(_KOPECK), "f")
+
+
 # ============================================================
 # СЕРВИС ПЛАТЕЖЕЙ
 # ============================================================
@@ -155,19 +187,63 @@ class PaymentService:
     # URL API ЮKassa
     API_URL = "https://api.yookassa.ru/v3"
     
+    # Кэш get_payment: время жизни для незавершённых платежей и размер LRU
+    GET_CACHE_TTL = 5.0
+    GET_CACHE_SIZE = 1024
+    
+    # Финальные статусы — такой платёж больше не меняется
+    TERMINAL_STATUSES = frozenset({"succeeded", "canceled"})
+    
+    # Webhook -> (порядок в жизненном цикле, статус платежа, статус заказа, поле времени)
+    WEBHOOK_TRANSITIONS = {
+        "payment.waiting_for_capture": (0, "frozen", "frozen", "frozen_at"),
+        "payment.succeeded": (1, "charged", "paid", "charged_at"),
+        "payment.canceled": (1, "cancelled", "cancelled", None),
+    }
+    
+    # Пачка webhook'ов: максимум событий и ожидание добора (сек)
+    WEBHOOK_BATCH_SIZE = 64
+    WEBHOOK_BATCH_WAIT = 0.05
+    
     def __init__(self):
         """Инициализация сервиса."""
         self.shop_id = settings.YOOKASSA_SHOP_ID
         self.secret_key = settings.YOOKASSA_SECRET_KEY
         self.db = get_db()
         
+        # Ключ подписи webhook'ов — кодируем один раз, а не на каждый запрос
+        self._webhook_secret = settings.YOOKASSA_WEBHOOK_SECRET.encode()
+        
+        # payment_id -> (время получения, платёж, ETag)
+        self._get_cache: "OrderedDict[str, Tuple[float, YooKassaPayment, Optional[str]]]" = OrderedDict()
+        
+        # Очередь webhook'ов и фоновая задача, которая её разбирает.
+        # Создаются при первом событии — уже внутри event loop.
+        self._event_queue: Optional[asyncio.Queue] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        
+        # Basic-авторизация считается один раз и вешается на общий клиент
+        token = base64.b64encode(f"{self.shop_id}:{self.secret_key}".encode()).decode()
+        self._default_headers = {
+            "Authorization": f"Basic {token}",
+            "Content-Type": "application/json"
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        
         # Проверяем наличие настроек
         if not self.shop_id or not self.secret_key:
             print("⚠️  PaymentService: YOOKASSA credentials не настроены")
     
-    def _get_auth(self) -> tuple:
-        """Получить данные авторизации для API."""
-        return (self.shop_id, self.secret_key)
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Общий HTTP-клиент для API ЮKassa.
+        
+        Держит пул соединений и заголовки авторизации,
+        создаётся при первом запросе.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(headers=self._default_headers)
+        return self._client
     
     def _get_headers(self, idempotence_key: str = None) -> dict:
         """
@@ -175,16 +251,47 @@ class PaymentService:
         
         Idempotence-Key нужен для защиты от дублирования запросов.
         """
-        headers = {
-            "Content-Type": "application/json"
-        }
+        return {"Idempotence-Key": idempotence_key or str(uuid.uuid4())}
+    
+    async def _post_with_retry(
+        self,
+        path: str,
+        json: dict,
+        key: str = None,
+        tries: int = 3,
+        base: float = 0.2
+    ) -> httpx.Response:
+        """
+        POST-запрос к API с повторами при временных ошибках.
         
-        if idempotence_key:
-            headers["Idempotence-Key"] = idempotence_key
-        else:
-            headers["Idempotence-Key"] = str(uuid.uuid4())
+        Повторяем при 5xx, 429 и сетевых ошибках с экспоненциальной
+        задержкой. После последней попытки не спим — сразу возвращаем
+        ответ (или пробрасываем исключение).
+        
+        Idempotence-Key общий для всех попыток, поэтому повтор
+        не создаст дубль платежа.
+        """
+        headers = self._get_headers(key or str(uuid.uuid4()))
+        content = orjson.dumps(json)
         
-        return headers
+        client = self._get_client()
+        
+        for attempt in range(tries):
+            try:
+                response = await client.post(
+                    f"{self.API_URL}{path}",
+                    content=content,
+                    headers=headers
+                )
+            except httpx.TransportError:
+                if attempt == tries - 1:
+                    raise
+            else:
+                retryable = response.status_code >= 500 or response.status_code == 429
+                if not retryable or attempt == tries - 1:
+                    return response
+            
+            await asyncio.sleep(base * (2 ** attempt) + random.random() * 0.05)
     
     # ============================================================
     # СОЗДАНИЕ ПЛАТЕЖА
@@ -237,10 +344,13 @@ class PaymentService:
                 error="Платёжная система не настроена"
             )
         
+        # Сумма строкой — считаем один раз для платежа, чека и БД
+        amount_str = _format_amount(amount)
+        
         # Формируем запрос
         payment_data = {
             "amount": {
-                "value": str(amount),
+                "value": amount_str,
                 "currency": "RUB"
             },
             "capture": False,  # Двухэтапная оплата!
@@ -269,7 +379,7 @@ class PaymentService:
                 "description": description[:128],  # Макс 128 символов
                 "quantity": "1.00",
                 "amount": {
-                    "value": str(amount),
+                    "value": amount_str,
                     "currency": "RUB"
                 },
                 "vat_code": 1,  # НДС не облагается
@@ -282,41 +392,35 @@ class PaymentService:
         
         # Отправляем запрос
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.API_URL}/payments",
-                    json=payment_data,
-                    auth=self._get_auth(),
-                    headers=self._get_headers()
+            response = await self._post_with_retry("/payments", payment_data)
+            
+            if response.status_code in (200, 201):
+                data: PaymentLite = orjson.loads(response.content)
+                confirmation = data.get("confirmation")
+                
+                # Сохраняем в БД
+                await self._save_payment_to_db(
+                    external_id=data["id"],
+                    order_id=order_id,
+                    amount=amount_str,
+                    status="pending"
+                )
+                
+                return PaymentCreateResult(
+                    success=True,
+                    payment_id=data["id"],
+                    confirmation_url=confirmation.get("confirmation_url") if confirmation else None,
+                    status=data["status"]
+                )
+            else:
+                error_data = orjson.loads(response.content)
+                error_msg = error_data.get("description", "Ошибка создания платежа")
+                
+                return PaymentCreateResult(
+                    success=False,
+                    error=error_msg
                 )
                 
-                if response.status_code in (200, 201):
-                    data = response.json()
-                    payment = YooKassaPayment(**data)
-                    
-                    # Сохраняем в БД
-                    await self._save_payment_to_db(
-                        external_id=payment.id,
-                        order_id=order_id,
-                        amount=amount,
-                        status="pending"
-                    )
-                    
-                    return PaymentCreateResult(
-                        success=True,
-                        payment_id=payment.id,
-                        confirmation_url=payment.confirmation.confirmation_url if payment.confirmation else None,
-                        status=payment.status
-                    )
-                else:
-                    error_data = response.json()
-                    error_msg = error_data.get("description", "Ошибка создания платежа")
-                    
-                    return PaymentCreateResult(
-                        success=False,
-                        error=error_msg
-                    )
-                    
         except Exception as e:
             return PaymentCreateResult(
                 success=False,
@@ -363,46 +467,39 @@ class PaymentService:
         capture_data = {}
         if amount:
             capture_data["amount"] = {
-                "value": str(amount),
+                "value": _format_amount(amount),
                 "currency": "RUB"
             }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.API_URL}/payments/{payment_id}/capture",
-                    json=capture_data,
-                    auth=self._get_auth(),
-                    headers=self._get_headers()
+            response = await self._post_with_retry(f"/payments/{payment_id}/capture", capture_data)
+            
+            if response.status_code == 200:
+                data: PaymentLite = orjson.loads(response.content)
+                
+                # Обновляем статус в БД
+                await self._update_payment_status(
+                    external_id=payment_id,
+                    status="charged",
+                    charged_at=datetime.now(timezone.utc)
+                )
+                
+                return PaymentCaptureResult(
+                    success=True,
+                    payment_id=data["id"],
+                    status=data["status"],
+                    amount=Decimal(data["amount"]["value"])
+                )
+            else:
+                error_data = orjson.loads(response.content)
+                return PaymentCaptureResult(
+                    success=False,
+                    payment_id=payment_id,
+                    status="error",
+                    amount=Decimal("0"),
+                    error=error_data.get("description", "Ошибка списания")
                 )
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    payment = YooKassaPayment(**data)
-                    
-                    # Обновляем статус в БД
-                    await self._update_payment_status(
-                        external_id=payment_id,
-                        status="charged",
-                        charged_at=datetime.now(timezone.utc)
-                    )
-                    
-                    return PaymentCaptureResult(
-                        success=True,
-                        payment_id=payment.id,
-                        status=payment.status,
-                        amount=Decimal(payment.amount.value)
-                    )
-                else:
-                    error_data = response.json()
-                    return PaymentCaptureResult(
-                        success=False,
-                        payment_id=payment_id,
-                        status="error",
-                        amount=Decimal("0"),
-                        error=error_data.get("description", "Ошибка списания")
-                    )
-                    
         except Exception as e:
             return PaymentCaptureResult(
                 success=False,
@@ -439,40 +536,33 @@ class PaymentService:
             )
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.API_URL}/payments/{payment_id}/cancel",
-                    json={},
-                    auth=self._get_auth(),
-                    headers=self._get_headers()
+            response = await self._post_with_retry(f"/payments/{payment_id}/cancel", {})
+            
+            if response.status_code == 200:
+                data: PaymentLite = orjson.loads(response.content)
+                
+                # Обновляем статус в БД
+                await self._update_payment_status(
+                    external_id=payment_id,
+                    status="cancelled"
+                )
+                
+                return PaymentCaptureResult(
+                    success=True,
+                    payment_id=data["id"],
+                    status=data["status"],
+                    amount=Decimal(data["amount"]["value"])
+                )
+            else:
+                error_data = orjson.loads(response.content)
+                return PaymentCaptureResult(
+                    success=False,
+                    payment_id=payment_id,
+                    status="error",
+                    amount=Decimal("0"),
+                    error=error_data.get("description", "Ошибка отмены")
                 )
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    payment = YooKassaPayment(**data)
-                    
-                    # Обновляем статус в БД
-                    await self._update_payment_status(
-                        external_id=payment_id,
-                        status="cancelled"
-                    )
-                    
-                    return PaymentCaptureResult(
-                        success=True,
-                        payment_id=payment.id,
-                        status=payment.status,
-                        amount=Decimal(payment.amount.value)
-                    )
-                else:
-                    error_data = response.json()
-                    return PaymentCaptureResult(
-                        success=False,
-                        payment_id=payment_id,
-                        status="error",
-                        amount=Decimal("0"),
-                        error=error_data.get("description", "Ошибка отмены")
-                    )
-                    
         except Exception as e:
             return PaymentCaptureResult(
                 success=False,
@@ -519,44 +609,38 @@ class PaymentService:
         refund_data = {
             "payment_id": payment_id,
             "amount": {
-                "value": str(amount),
+                "value": _format_amount(amount),
                 "currency": "RUB"
             },
             "description": description
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.API_URL}/refunds",
-                    json=refund_data,
-                    auth=self._get_auth(),
-                    headers=self._get_headers()
+            response = await self._post_with_retry("/refunds", refund_data)
+            
+            if response.status_code in (200, 201):
+                data = orjson.loads(response.content)
+                
+                # Обновляем статус в БД
+                await self._update_payment_status(
+                    external_id=payment_id,
+                    status="refunded",
+                    refunded_at=datetime.now(timezone.utc)
+                )
+                
+                return RefundResult(
+                    success=True,
+                    refund_id=data.get("id"),
+                    status=data.get("status"),
+                    amount=Decimal(data["amount"]["value"])
+                )
+            else:
+                error_data = orjson.loads(response.content)
+                return RefundResult(
+                    success=False,
+                    error=error_data.get("description", "Ошибка возврата")
                 )
                 
-                if response.status_code in (200, 201):
-                    data = response.json()
-                    
-                    # Обновляем статус в БД
-                    await self._update_payment_status(
-                        external_id=payment_id,
-                        status="refunded",
-                        refunded_at=datetime.now(timezone.utc)
-                    )
-                    
-                    return RefundResult(
-                        success=True,
-                        refund_id=data.get("id"),
-                        status=data.get("status"),
-                        amount=Decimal(data["amount"]["value"])
-                    )
-                else:
-                    error_data = response.json()
-                    return RefundResult(
-                        success=False,
-                        error=error_data.get("description", "Ошибка возврата")
-                    )
-                    
         except Exception as e:
             return RefundResult(
                 success=False,
@@ -571,6 +655,10 @@ class PaymentService:
         """
         Получить информацию о платеже.
         
+        Ответы кэшируются: платежи в финальном статусе — навсегда,
+        остальные — на GET_CACHE_TTL секунд. По истечении TTL запрос
+        уходит с If-None-Match, и при ответе 304 берётся кэш.
+        
         Параметры:
             payment_id: ID платежа в ЮKassa
         
@@ -580,22 +668,54 @@ class PaymentService:
         if not self.shop_id:
             return None
         
+        cached = self._get_cache.get(payment_id)
+        if cached:
+            fetched_at, payment, etag = cached
+            if (
+                payment.status in self.TERMINAL_STATUSES
+                or time.monotonic() - fetched_at < self.GET_CACHE_TTL
+            ):
+                self._get_cache.move_to_end(payment_id)
+                return payment
+        
+        headers = {}
+        if cached and cached[2]:
+            headers["If-None-Match"] = cached[2]
+        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.API_URL}/payments/{payment_id}",
-                    auth=self._get_auth()
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return YooKassaPayment(**data)
+            response = await self._get_client().get(
+                f"{self.API_URL}/payments/{payment_id}",
+                headers=headers
+            )
+            
+            if response.status_code == 304 and cached:
+                self._cache_payment(payment_id, cached[1], cached[2])
+                return cached[1]
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                payment = YooKassaPayment(**data)
+                self._cache_payment(payment_id, payment, response.headers.get("ETag"))
+                return payment
                     
         except Exception:
             pass
         
         return None
     
+    def _cache_payment(
+        self,
+        payment_id: str,
+        payment: YooKassaPayment,
+        etag: Optional[str]
+    ):
+        """Положить платёж в кэш get_payment (LRU)."""
+        self._get_cache[payment_id] = (time.monotonic(), payment, etag)
+        self._get_cache.move_to_end(payment_id)
+        
+        if len(self._get_cache) > self.GET_CACHE_SIZE:
+            self._get_cache.popitem(last=False)
+    
     # ============================================================
     # WEBHOOK
     # ============================================================
@@ -615,22 +735,70 @@ class PaymentService:
         Возвращает:
             bool: True если подпись верна
         """
-        if not settings.YOOKASSA_WEBHOOK_SECRET:
+        if not self._webhook_secret:
             # Без секрета не можем проверить
             return True  # Для разработки
         
-        expected = hmac.new(
-            settings.YOOKASSA_WEBHOOK_SECRET.encode(),
-            body,
-            hashlib.sha256
-        ).hexdigest()
+        # Сравниваем сырые 32 байта дайджеста, а не hex-строки
+        try:
+            received = bytes.fromhex(signature)
+        except ValueError:
+            return False
+        
+        expected = hmac.new(self._webhook_secret, body, hashlib.sha256).digest()
         
-        return hmac.compare_digest(expected, signature)
+        return hmac.compare_digest(expected, received)
+    
+    async def verify_webhook_signature_stream(
+        self,
+        request: Request,
+        signature: str
+    ) -> Tuple[bool, bytearray]:
+        """
+        Проверить подпись webhook, считая HMAC по мере чтения тела.
+        
+        В отличие от verify_webhook_signature не требует заранее
+        вычитанного request.body(): куски тела сразу идут в HMAC
+        и в единственный буфер, который возвращается вызывающему.
+        
+        Параметры:
+            request: Входящий запрос FastAPI
+            signature: Значение заголовка Webhook-Signature
+        
+        Возвращает:
+            Tuple[bool, bytearray]: (подпись верна, тело запроса)
+        """
+        mac = hmac.new(self._webhook_secret, digestmod=hashlib.sha256)
+        buf = bytearray()
+        
+        async for chunk in request.stream():
+            mac.update(chunk)
+            buf.extend(chunk)
+        
+        if not self._webhook_secret:
+            # Без секрета не можем проверить
+            return True, buf  # Для разработки
+        
+        try:
+            received = bytes.fromhex(signature)
+        except ValueError:
+            return False, buf
+        
+        return hmac.compare_digest(mac.digest(), received), buf
     
     async def handle_webhook(self, event_type: str, payment_data: dict) -> bool:
         """
         Обработать webhook от ЮKassa.
         
+        Событие не пишется в БД сразу, а ставится в очередь. Фоновая
+        задача _drain_events собирает пачку событий, схлопывает их
+        до последнего статуса каждого платежа и обновляет БД
+        одним запросом на статус.
+        
+        Ответ возвращается только после записи пачки: если запись
+        не удалась, исключение уходит в роутер (500), и ЮKassa
+        пришлёт webhook повторно.
+        
         Типы событий:
         - payment.waiting_for_capture: Деньги заморожены
         - payment.succeeded: Платёж успешен (после capture)
@@ -644,58 +812,180 @@ class PaymentService:
         Возвращает:
             bool: Успешно ли обработано
         """
-        payment_id = payment_data.get("id")
-        status = payment_data.get("status")
+        if event_type not in self.WEBHOOK_TRANSITIONS:
+            return False
         
-        if event_type == "payment.waiting_for_capture":
-            # Деньги заморожены — обновляем статус заказа
-            await self._update_payment_status(
-                external_id=payment_id,
-                status="frozen",
-                frozen_at=datetime.now(timezone.utc)
-            )
+        if self._event_queue is None:
+            self._event_queue = asyncio.Queue()
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.create_task(self._drain_events())
+        
+        # Future завершится, когда пачка с этим событием будет записана в БД
+        written = asyncio.get_running_loop().create_future()
+        await self._event_queue.put((event_type, payment_data, written))
+        
+        await written
+        return True
+    
+    async def _drain_events(self):
+        """
+        Фоновая обработка очереди webhook'ов.
+        
+        Ждём первое событие, затем добираем до WEBHOOK_BATCH_SIZE
+        событий, но не дольше WEBHOOK_BATCH_WAIT секунд.
+        """
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._event_queue.get()]
+            deadline = loop.time() + self.WEBHOOK_BATCH_WAIT
+            
+            while len(batch) < self.WEBHOOK_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._event_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
             
-            # Обновляем заказ
-            order_id = payment_data.get("metadata", {}).get("order_id")
+            try:
+                await self._flush_events(batch)
+            except Exception as e:
+                print(f"⚠️  PaymentService: ошибка обработки webhook'ов: {e}")
+                # Ни одно событие пачки не считается записанным
+                for _, _, written in batch:
+                    self._resolve_written(written, e)
+            finally:
+                for _ in batch:
+                    self._event_queue.task_done()
+    
+    async def _flush_events(self, batch: list):
+        """
+        Записать пачку событий в БД.
+        
+        Для каждого платежа берём самое позднее по жизненному циклу
+        событие (повторная доставка waiting_for_capture не откатит
+        succeeded), затем обновляем payments и orders одним запросом
+        на каждый итоговый статус. Поля времени (frozen_at, charged_at)
+        пишутся для всех событий платежа в пачке, а не только для последнего.
+        
+        Future каждого события завершается после записи статуса его
+        платежа — успешно или с исключением, если запись не удалась.
+        """
+        # external_id -> (event_type, order_id)
+        latest: Dict[str, Tuple[str, Optional[int]]] = {}
+        # external_id -> future всех событий этого платежа в пачке
+        waiters: Dict[str, list] = {}
+        # external_id -> поля времени всех событий этого платежа в пачке
+        time_fields: Dict[str, set] = {}
+        
+        for event_type, payment_data, written in batch:
+            payment_id = payment_data.get("id")
+            if not payment_id:
+                self._resolve_written(written)
+                continue
+            
+            order_id = (payment_data.get("metadata") or {}).get("order_id")
             if order_id:
-                self.db.table("orders").update({
-                    "status": "frozen"
-                }).eq("id", int(order_id)).execute()
+                try:
+                    order_id = int(order_id)
+                except (TypeError, ValueError):
+                    # Битое событие отклоняем само по себе, остальные пишем
+                    print(f"⚠️  PaymentService: некорректный order_id {order_id!r} в платеже {payment_id}")
+                    self._resolve_written(written, ValueError(f"Некорректный order_id: {order_id!r}"))
+                    continue
             
-            return True
+            waiters.setdefault(payment_id, []).append(written)
             
-        elif event_type == "payment.succeeded":
-            # Платёж успешен
-            await self._update_payment_status(
-                external_id=payment_id,
-                status="charged",
-                charged_at=datetime.now(timezone.utc)
-            )
+            time_field = self.WEBHOOK_TRANSITIONS[event_type][3]
+            if time_field:
+                time_fields.setdefault(payment_id, set()).add(time_field)
             
-            order_id = payment_data.get("metadata", {}).get("order_id")
+            prev = latest.get(payment_id)
+            if prev and self.WEBHOOK_TRANSITIONS[prev[0]][0] > self.WEBHOOK_TRANSITIONS[event_type][0]:
+                continue
+            
+            latest[payment_id] = (event_type, order_id)
+        
+        # (event_type, поля времени) -> (external_ids, order_ids)
+        grouped: Dict[Tuple[str, tuple], Tuple[list, list]] = {}
+        for payment_id, (event_type, order_id) in latest.items():
+            fields = tuple(sorted(time_fields.get(payment_id, ())))
+            payment_ids, order_ids = grouped.setdefault((event_type, fields), ([], []))
+            payment_ids.append(payment_id)
             if order_id:
-                self.db.table("orders").update({
-                    "status": "paid"
-                }).eq("id", int(order_id)).execute()
+                order_ids.append(order_id)
+        
+        now = datetime.now(timezone.utc).isoformat()
+        
+        for (event_type, fields), (payment_ids, order_ids) in grouped.items():
+            _, payment_status, order_status, _ = self.WEBHOOK_TRANSITIONS[event_type]
             
-            return True
+            update_data = {"status": payment_status}
+            for field in fields:
+                update_data[field] = now
             
-        elif event_type == "payment.canceled":
-            # Платёж отменён
-            await self._update_payment_status(
-                external_id=payment_id,
-                status="cancelled"
-            )
+            error = None
+            try:
+                self.db.table("payments").update(update_data).in_("external_id", payment_ids).execute()
+                
+                if order_ids:
+                    self.db.table("orders").update({
+                        "status": order_status
+                    }).in_("id", order_ids).execute()
+            except Exception as e:
+                # Ошибка одного статуса не мешает записать остальные
+                print(f"⚠️  PaymentService: не удалось записать {event_type}: {e}")
+                error = e
             
-            order_id = payment_data.get("metadata", {}).get("order_id")
-            if order_id:
-                self.db.table("orders").update({
-                    "status": "cancelled"
-                }).eq("id", int(order_id)).execute()
+            for payment_id in payment_ids:
+                # Статус сменился — закэшированные ответы get_payment устарели
+                self._get_cache.pop(payment_id, None)
+                
+                for written in waiters[payment_id]:
+                    self._resolve_written(written, error)
+    
+    @staticmethod
+    def _resolve_written(written: asyncio.Future, error: Exception = None):
+        """
+        Сообщить handle_webhook, записано ли событие.
+        
+        Если запрос уже отменён (клиент отключился), future завершён —
+        тогда ничего не делаем.
+        """
+        if written.done():
+            return
+        if error:
+            written.set_exception(error)
+        else:
+            written.set_result(None)
+    
+    async def aclose(self):
+        """
+        Остановка сервиса (вызывается при завершении приложения).
+        
+        Дожидается записи всех webhook'ов из очереди, останавливает
+        фоновую задачу и закрывает HTTP-клиент ЮKassa.
+        """
+        if self._event_queue is not None:
+            # Задача могла упасть — тогда события в очереди разберёт новая
+            if not self._event_queue.empty() and (self._drain_task is None or self._drain_task.done()):
+                self._drain_task = asyncio.create_task(self._drain_events())
             
-            return True
+            await self._event_queue.join()
+        
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+            try:
+                await self._drain_task
+            except asyncio.CancelledError:
+                pass
+            self._drain_task = None
         
-        return False
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     # ============================================================
     # РАБОТА С БД
@@ -705,13 +995,18 @@ class PaymentService:
         self,
         external_id: str,
         order_id: int,
-        amount: Decimal,
+        amount: str,
         status: str
     ):
-        """Сохранить платёж в БД."""
+        """
+        Сохранить платёж в БД.
+        
+        amount передаётся строкой ("19000.00") и попадает в колонку
+        DECIMAL(12, 2) без промежуточного float.
+        """
         self.db.table("payments").insert({
             "order_id": order_id,
-            "amount": float(amount),
+            "amount": amount,
             "status": status,
             "method": "card",
             "external_id": external_id
@@ -726,6 +1021,9 @@ class PaymentService:
         refunded_at: datetime = None
     ):
         """Обновить статус платежа в БД."""
+        # Статус сменился — закэшированный ответ get_payment устарел
+        self._get_cache.pop(external_id, None)
+        
         update_data = {"status": status}
         
         if frozen_at:
@@ -751,3 +1049,9 @@ def get_payment_service() -> PaymentService:
     if _payment_service is None:
         _payment_service = PaymentService()
     return _payment_service
+
+
+async def close_payment_service():
+    """Остановить PaymentService при завершении приложения (если он создавался)."""
+    if _payment_service is not None:
+        await _payment_service.aclose()
@@ -33,8 +33,12 @@
     # price = 22000 (достигли порог 3, но не 10)
 """
 
+from bisect import bisect_right
+from dataclasses import dataclass
 from decimal import Decimal
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
 
@@ -86,12 +90,121 @@ class TierProgress(BaseModel):
     progress_percent: float      # Прогресс до этого порога (0-100)
 
 
+@dataclass(frozen=True, slots=True)
+class TierSet:
+    """
+    Нормализованные ценовые пороги товара.
+    
+    Отсортированы по возрастанию min_quantity, цены — в копейках.
+    Все функции модуля принимают TierSet вместо списка словарей:
+    тогда нормализация не выполняется вовсе.
+    
+    Атрибуты:
+        quantities: min_quantity порогов по возрастанию
+        prices_k: Цены порогов в копейках (в том же порядке)
+    
+    Пример:
+        tier_set = TierSet.from_dicts(product["price_tiers"])
+        price = calculate_current_price(tier_set, 15, base_price)
+    """
+    quantities: Tuple[int, ...]
+    prices_k: Tuple[int, ...]
+    
+    @classmethod
+    def from_dicts(cls, price_tiers: List[dict]) -> "TierSet":
+        """Построить (или взять из кэша) TierSet из порогов в формате БД."""
+        return _normalized_tiers(_tiers_key(price_tiers))
+    
+    def __len__(self) -> int:
+        return len(self.quantities)
+
+
+# Пороги в формате БД или уже нормализованные
+Tiers = Union[List[dict], TierSet]
+
+
+# ============================================================
+# НОРМАЛИЗАЦИЯ ПОРОГОВ
+# ============================================================
+
+def _tiers_key(price_tiers: List[dict]) -> Tuple[Tuple[int, str], ...]:
+    """Хэшируемый ключ порогов для кэша: ((min_quantity, "price"), ...)."""
+    return tuple((tier["min_quantity"], str(tier["price"])) for tier in price_tiers)
+
+
+def _to_kopecks(value) -> int:
+    """Цена в копейках: 19000 → 1900000."""
+    return int(Decimal(str(value)) * 100)
+
+
+def _from_kopecks(kopecks: int) -> Decimal:
+    """Копейки обратно в Decimal рублей для ответа API: 1900000 → Decimal('19000')."""
+    return Decimal(kopecks) / 100
+
+
+def _savings_kopecks(base_k: int, current_k: int) -> Tuple[int, float]:
+    """
+    Экономия в копейках и процентах, без Decimal.
+    
+    Процент округляется до одного знака, как в calculate_savings.
+    """
+    amount_k = base_k - current_k
+    
+    if base_k > 0:
+        percent = round(amount_k * 100 / base_k, 1)
+    else:
+        percent = 0.0
+    
+    return amount_k, percent
+
+
+@lru_cache(maxsize=1024)
+def _normalized_tiers(key: Tuple[Tuple[int, str], ...]) -> TierSet:
+    """
+    Отсортированные по возрастанию min_quantity пороги.
+    
+    Кэшируется: у одного товара пороги одинаковые между запросами,
+    поэтому сортировка и перевод цен выполняются один раз.
+    Цены хранятся целыми копейками — внутри модуля считаем в int,
+    а в Decimal переводим только на выходе.
+    
+    Если у нескольких порогов одинаковый min_quantity, действует
+    первый из них по порядку в списке — остальные отбрасываются.
+    """
+    tiers = []
+    seen = set()
+    for quantity, price in key:
+        if quantity in seen:
+            continue
+        seen.add(quantity)
+        tiers.append((quantity, _to_kopecks(price)))
+    
+    # В БД пороги обычно уже лежат по возрастанию — тогда не сортируем
+    if any(tiers[i][0] > tiers[i + 1][0] for i in range(len(tiers) - 1)):
+        tiers.sort(key=itemgetter(0))
+    
+    return TierSet(
+        quantities=tuple(quantity for quantity, _ in tiers),
+        prices_k=tuple(price_k for _, price_k in tiers)
+    )
+
+
+_EMPTY_TIERS = TierSet(quantities=(), prices_k=())
+
+
+def _get_tiers(price_tiers: Tiers) -> TierSet:
+    """TierSet для порогов в любом из принимаемых форматов."""
+    if isinstance(price_tiers, TierSet):
+        return price_tiers
+    return _normalized_tiers(_tiers_key(price_tiers))
+
+
 # ============================================================
 # ОСНОВНЫЕ ФУНКЦИИ
 # ============================================================
 
 def calculate_current_price(
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     participants_count: int,
     base_price: Decimal = None
 ) -> Decimal:
@@ -99,12 +212,12 @@ def calculate_current_price(
     Рассчитать текущую цену на основе количества участников.
     
     Алгоритм:
-    1. Сортируем пороги по min_quantity (по убыванию)
-    2. Находим первый порог, где min_quantity <= participants_count
+    1. Берём пороги, отсортированные по min_quantity (из кэша)
+    2. Бинарным поиском находим последний порог, где min_quantity <= participants_count
     3. Возвращаем соответствующую цену
     
     Параметры:
-        price_tiers: Список ценовых порогов
+        price_tiers: Список ценовых порогов или TierSet
             [{"min_quantity": 3, "price": 22000}, ...]
         participants_count: Текущее количество участников
         base_price: Базовая цена (если участников меньше минимума)
@@ -135,37 +248,29 @@ def calculate_current_price(
         # Нет порогов — возвращаем базовую цену
         return Decimal(str(base_price)) if base_price else Decimal("0")
     
-    # Преобразуем в объекты PriceTier и сортируем по убыванию min_quantity
-    tiers = []
-    for tier in price_tiers:
-        tiers.append(PriceTier(
-            min_quantity=tier["min_quantity"],
-            price=Decimal(str(tier["price"]))
-        ))
-    
-    tiers.sort(key=lambda t: t.min_quantity, reverse=True)
+    tiers = _get_tiers(price_tiers)
     
-    # Ищем первый достигнутый порог
-    for tier in tiers:
-        if participants_count >= tier.min_quantity:
-            return tier.price
+    # Последний порог с min_quantity <= participants_count
+    idx = bisect_right(tiers.quantities, participants_count) - 1
+    if idx >= 0:
+        return _from_kopecks(tiers.prices_k[idx])
     
     # Не достигли ни одного порога — возвращаем базовую цену
     if base_price:
         return Decimal(str(base_price))
     
     # Если нет базовой цены, берём цену первого (самого маленького) порога
-    return tiers[-1].price if tiers else Decimal("0")
+    return _from_kopecks(tiers.prices_k[0])
 
 
-def get_best_price(price_tiers: List[dict]) -> Decimal:
+def get_best_price(price_tiers: Tiers) -> Decimal:
     """
     Получить лучшую (минимальную) возможную цену.
     
     Это цена при максимальном количестве участников.
     
     Параметры:
-        price_tiers: Список ценовых порогов
+        price_tiers: Список ценовых порогов или TierSet
     
     Возвращает:
         Decimal: Минимальная возможная цена
@@ -181,9 +286,8 @@ def get_best_price(price_tiers: List[dict]) -> Decimal:
     if not price_tiers:
         return Decimal("0")
     
-    # Находим порог с наибольшим min_quantity
-    max_tier = max(price_tiers, key=lambda t: t["min_quantity"])
-    return Decimal(str(max_tier["price"]))
+    # Пороги отсортированы — у последнего наибольший min_quantity
+    return _from_kopecks(_get_tiers(price_tiers).prices_k[-1])
 
 
 def calculate_savings(
@@ -204,28 +308,24 @@ def calculate_savings(
         >>> calculate_savings(Decimal("25000"), Decimal("19000"))
         (Decimal('6000'), 24.0)
     """
-    base = Decimal(str(base_price))
-    current = Decimal(str(current_price))
-    
-    savings_amount = base - current
-    
-    if base > 0:
-        savings_percent = float((savings_amount / base) * 100)
-    else:
-        savings_percent = 0.0
+    # Считаем в копейках, без деления Decimal
+    savings_k, savings_percent = _savings_kopecks(
+        _to_kopecks(base_price),
+        _to_kopecks(current_price)
+    )
     
-    return savings_amount, round(savings_percent, 1)
+    return _from_kopecks(savings_k), savings_percent
 
 
 def get_next_tier_info(
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     current_participants: int
 ) -> Optional[dict]:
     """
     Получить информацию о следующем ценовом пороге.
     
     Параметры:
-        price_tiers: Список ценовых порогов
+        price_tiers: Список ценовых порогов или TierSet
         current_participants: Текущее количество участников
     
     Возвращает:
@@ -253,44 +353,36 @@ def get_next_tier_info(
     if not price_tiers:
         return None
     
-    # Сортируем по min_quantity (по возрастанию)
-    sorted_tiers = sorted(price_tiers, key=lambda t: t["min_quantity"])
-    
-    # Находим текущий и следующий порог
-    current_price = None
-    next_tier = None
-    
-    for i, tier in enumerate(sorted_tiers):
-        if tier["min_quantity"] <= current_participants:
-            current_price = Decimal(str(tier["price"]))
-        else:
-            # Это первый недостигнутый порог — он и есть следующий
-            next_tier = tier
-            break
+    tiers = _get_tiers(price_tiers)
     
-    if next_tier is None:
+    # Первый недостигнутый порог — он и есть следующий
+    idx = bisect_right(tiers.quantities, current_participants)
+    if idx == len(tiers):
         # Достигли максимального порога
         return None
     
-    next_price = Decimal(str(next_tier["price"]))
-    people_needed = next_tier["min_quantity"] - current_participants
+    next_quantity = tiers.quantities[idx]
+    next_price_k = tiers.prices_k[idx]
+    current_price_k = tiers.prices_k[idx - 1] if idx > 0 else None
+    
+    people_needed = next_quantity - current_participants
     
     # Экономия на человека при достижении следующего порога
-    if current_price:
-        savings_per_person = current_price - next_price
+    if current_price_k:
+        savings_per_person = _from_kopecks(current_price_k - next_price_k)
     else:
         savings_per_person = Decimal("0")
     
     return {
-        "next_price": next_price,
-        "next_quantity": next_tier["min_quantity"],
+        "next_price": _from_kopecks(next_price_k),
+        "next_quantity": next_quantity,
         "people_needed": people_needed,
         "savings_per_person": savings_per_person
     }
 
 
 def get_full_price_info(
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     base_price: Decimal,
     participants_count: int
 ) -> PriceInfo:
@@ -298,9 +390,11 @@ def get_full_price_info(
     Получить полную информацию о цене.
     
     Собирает всю информацию в один объект для фронтенда.
+    Пороги нормализуются один раз, дальше всё считается
+    в _compute_price_info.
     
     Параметры:
-        price_tiers: Список ценовых порогов
+        price_tiers: Список ценовых порогов или TierSet
         base_price: Базовая цена
         participants_count: Текущее количество участников
     
@@ -317,27 +411,66 @@ def get_full_price_info(
         10
     """
     base = Decimal(str(base_price))
-    current = calculate_current_price(price_tiers, participants_count, base)
-    best = get_best_price(price_tiers) if price_tiers else base
+    tiers = _get_tiers(price_tiers) if price_tiers else _EMPTY_TIERS
+    
+    return _compute_price_info(tiers, base, participants_count)
+
+
+def _compute_price_info(
+    tiers: TierSet,
+    base: Decimal,
+    participants_count: int
+) -> PriceInfo:
+    """
+    Собрать PriceInfo за один проход по нормализованным порогам.
+    
+    Один bisect даёт и текущий, и следующий порог — то же, что
+    calculate_current_price + get_best_price + get_next_tier_info,
+    но без повторного поиска. Считаем в копейках, Decimal — только
+    в полях результата.
+    """
+    base_k = _to_kopecks(base)
+    
+    # Первый недостигнутый порог
+    idx = bisect_right(tiers.quantities, participants_count)
     
-    savings_amount, savings_percent = calculate_savings(base, current)
-    next_tier = get_next_tier_info(price_tiers, participants_count)
+    # Текущая цена (как в calculate_current_price)
+    if idx:
+        current_k = tiers.prices_k[idx - 1]
+    elif base or not tiers:
+        current_k = base_k
+    else:
+        current_k = tiers.prices_k[0]
+    
+    # Лучшая цена — у порога с наибольшим min_quantity
+    best_k = tiers.prices_k[-1] if tiers else base_k
+    
+    savings_k, savings_percent = _savings_kopecks(base_k, current_k)
+    
+    # Следующий порог
+    next_tier_price = None
+    next_tier_quantity = None
+    people_to_next_tier = None
+    if idx < len(tiers):
+        next_tier_quantity = tiers.quantities[idx]
+        next_tier_price = _from_kopecks(tiers.prices_k[idx])
+        people_to_next_tier = next_tier_quantity - participants_count
     
     return PriceInfo(
-        current_price=current,
+        current_price=_from_kopecks(current_k),
         base_price=base,
-        best_price=best,
-        savings_amount=savings_amount,
+        best_price=_from_kopecks(best_k),
+        savings_amount=_from_kopecks(savings_k),
         savings_percent=savings_percent,
         participants=participants_count,
-        next_tier_price=next_tier["next_price"] if next_tier else None,
-        next_tier_quantity=next_tier["next_quantity"] if next_tier else None,
-        people_to_next_tier=next_tier["people_needed"] if next_tier else None
+        next_tier_price=next_tier_price,
+        next_tier_quantity=next_tier_quantity,
+        people_to_next_tier=people_to_next_tier
     )
 
 
 def get_tiers_progress(
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     participants_count: int
 ) -> List[TierProgress]:
     """
@@ -346,7 +479,7 @@ def get_tiers_progress(
     Используется для визуализации "лестницы цен".
     
     Параметры:
-        price_tiers: Список ценовых порогов
+        price_tiers: Список ценовых порогов или TierSet
         participants_count: Текущее количество участников
     
     Возвращает:
@@ -363,30 +496,111 @@ def get_tiers_progress(
     if not price_tiers:
         return []
     
-    # Сортируем по min_quantity
-    sorted_tiers = sorted(price_tiers, key=lambda t: t["min_quantity"])
+    # Пороги по возрастанию min_quantity
+    tiers = _get_tiers(price_tiers)
+    
+    progress = _tiers_progress_core(tiers.quantities, participants_count)
+    
+    return [
+        TierProgress(
+            tier_price=_from_kopecks(price),
+            tier_quantity=quantity,
+            is_reached=is_reached,
+            is_current=is_current,
+            progress_percent=progress_percent
+        )
+        for quantity, price, (is_reached, is_current, progress_percent)
+        in zip(tiers.quantities, tiers.prices_k, progress)
+    ]
+
+
+def get_tiers_progress_batch(
+    products: List[Tuple[Tiers, int]]
+) -> List[List[TierProgress]]:
+    """
+    Прогресс по порогам сразу для многих сборов (дашборды, списки).
+    
+    Сборы с одинаковыми порогами делят один TierSet и один набор
+    Decimal-цен, а числовое ядро кэшируется по (порогам, участникам) —
+    повторяющиеся комбинации считаются один раз.
+    
+    Параметры:
+        products: Список пар (ценовые пороги, количество участников)
+    
+    Возвращает:
+        List[List[TierProgress]]: Прогресс для каждой пары, в том же порядке
+    
+    Пример:
+        >>> batch = get_tiers_progress_batch([(tiers, 15), (tiers, 30)])
+        >>> [p.is_current for p in batch[0]]
+        [False, True, False]
+    """
+    # TierSet -> цены порогов в Decimal (общие для всех сборов товара)
+    tier_prices: Dict[TierSet, List[Decimal]] = {}
+    result = []
+    
+    for price_tiers, participants_count in products:
+        if not price_tiers:
+            result.append([])
+            continue
+        
+        tiers = _get_tiers(price_tiers)
+        
+        prices = tier_prices.get(tiers)
+        if prices is None:
+            prices = tier_prices[tiers] = [_from_kopecks(price) for price in tiers.prices_k]
+        
+        progress = _tiers_progress_core(tiers.quantities, participants_count)
+        
+        result.append([
+            TierProgress(
+                tier_price=price,
+                tier_quantity=quantity,
+                is_reached=is_reached,
+                is_current=is_current,
+                progress_percent=progress_percent
+            )
+            for quantity, price, (is_reached, is_current, progress_percent)
+            in zip(tiers.quantities, prices, progress)
+        ])
+    
+    return result
+
+
+@lru_cache(maxsize=4096)
+def _tiers_progress_core(
+    quantities: Tuple[int, ...],
+    participants_count: int
+) -> Tuple[Tuple[bool, bool, float], ...]:
+    """
+    Числовое ядро get_tiers_progress: только int/float, без моделей.
+    
+    Зависит лишь от порогов и числа участников, поэтому кэшируется —
+    при повторных запросах к тому же сбору цикл не выполняется.
+    
+    Возвращает:
+        Tuple: ((is_reached, is_current, progress_percent), ...) по каждому порогу
+    """
+    last = len(quantities) - 1
     
     result = []
     prev_quantity = 0
     current_tier_found = False
     
-    for tier in sorted_tiers:
-        quantity = tier["min_quantity"]
-        price = Decimal(str(tier["price"]))
-        
+    for i, quantity in enumerate(quantities):
         is_reached = participants_count >= quantity
         
-        # Определяем, это ли текущий уровень (достигнут, но следующий — нет)
-        is_current = False
-        if is_reached and not current_tier_found:
-            # Проверяем, есть ли следующий порог и достигнут ли он
-            next_tier = next(
-                (t for t in sorted_tiers if t["min_quantity"] > quantity),
-                None
-            )
-            if next_tier is None or participants_count < next_tier["min_quantity"]:
-                is_current = True
-                current_tier_found = True
+        # Следующий порог — просто соседний элемент (пороги отсортированы)
+        next_quantity = quantities[i + 1] if i < last else None
+        
+        # Это текущий уровень, если он достигнут, а следующий — нет
+        is_current = (
+            is_reached
+            and (next_quantity is None or participants_count < next_quantity)
+            and not current_tier_found
+        )
+        if is_current:
+            current_tier_found = True
         
         # Рассчитываем прогресс
         if is_reached:
@@ -397,25 +611,28 @@ def get_tiers_progress(
             progress_in_range = participants_count - prev_quantity
             progress = min(100.0, max(0.0, (progress_in_range / range_size) * 100))
         
-        result.append(TierProgress(
-            tier_price=price,
-            tier_quantity=quantity,
-            is_reached=is_reached,
-            is_current=is_current,
-            progress_percent=round(progress, 1)
-        ))
+        result.append((is_reached, is_current, round(progress, 1)))
         
         prev_quantity = quantity
     
-    return result
+    return tuple(result)
 
 
 # ============================================================
 # ГЕНЕРАЦИЯ СООБЩЕНИЙ
 # ============================================================
 
+# Разделитель тысяч: "19,000" → "19 000"
+_COMMA_TO_SPACE = str.maketrans(",", " ")
+
+
+def _fmt_price(price: Decimal) -> str:
+    """Форматировать цену с пробелами между разрядами (19 000)."""
+    return format(int(price), ",").translate(_COMMA_TO_SPACE)
+
+
 def generate_price_message(
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     base_price: Decimal,
     participants_count: int
 ) -> str:
@@ -438,26 +655,22 @@ def generate_price_message(
     """
     info = get_full_price_info(price_tiers, base_price, participants_count)
     
-    # Форматируем цены с пробелами (19 000)
-    def format_price(price: Decimal) -> str:
-        return f"{int(price):,}".replace(",", " ")
-    
     lines = []
     
     # Текущая цена и экономия
     if info.savings_percent > 0:
         lines.append(
-            f"💰 Текущая цена: {format_price(info.current_price)}₽ "
+            f"💰 Текущая цена: {_fmt_price(info.current_price)}₽ "
             f"(экономия {info.savings_percent:.0f}%)"
         )
     else:
-        lines.append(f"💰 Текущая цена: {format_price(info.current_price)}₽")
+        lines.append(f"💰 Текущая цена: {_fmt_price(info.current_price)}₽")
     
     # Следующий порог
     if info.people_to_next_tier and info.next_tier_price:
         lines.append(
             f"👥 Ещё {info.people_to_next_tier} человек — "
-            f"и будет {format_price(info.next_tier_price)}₽!"
+            f"и будет {_fmt_price(info.next_tier_price)}₽!"
         )
     
     return "\n".join(lines)
@@ -465,7 +678,7 @@ def generate_price_message(
 
 def generate_share_text(
     product_name: str,
-    price_tiers: List[dict],
+    price_tiers: Tiers,
     base_price: Decimal,
     participants_count: int
 ) -> str:
@@ -483,12 +696,9 @@ def generate_share_text(
     """
     info = get_full_price_info(price_tiers, base_price, participants_count)
     
-    def format_price(price: Decimal) -> str:
-        return f"{int(price):,}".replace(",", " ")
-    
     text = f"🛍 Собираем на {product_name}!\n\n"
-    text += f"💰 Сейчас: {format_price(info.current_price)}₽\n"
-    text += f"🎯 Может быть: {format_price(info.best_price)}₽\n"
+    text += f"💰 Сейчас: {_fmt_price(info.current_price)}₽\n"
+    text += f"🎯 Может быть: {_fmt_price(info.best_price)}₽\n"
     text += f"👥 Уже {participants_count} человек\n\n"
     text += "Присоединяйся 👇"
     
@@ -24,18 +24,28 @@
         return await get_user_by_id(user_id)
 """
 
-from datetime import datetime, timedelta
-from typing import Optional
-
-from fastapi import Depends, HTTPException, status
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
+import jwt
+import orjson
 from pydantic import BaseModel
 
 import sys
 sys.path.append("..")
 from config import settings
 
+logger = logging.getLogger(__name__)
+
 
 # ============================================================
 # НАСТРОЙКИ
@@ -50,6 +60,14 @@ security = HTTPBearer(
 )
 
 
+# Время жизни access токена в секундах (константа на всё время работы)
+TOKEN_EXPIRE_SECONDS = settings.JWT_EXPIRE_HOURS * 3600
+
+# Кэш проверенных токенов: время жизни записи (сек) и размер LRU
+TOKEN_CACHE_TTL = 60
+TOKEN_CACHE_SIZE = 10_000
+
+
 # ============================================================
 # МОДЕЛИ
 # ============================================================
@@ -61,14 +79,14 @@ class TokenPayload(BaseModel):
     Атрибуты:
         sub: Subject — ID пользователя (строка для совместимости)
         telegram_id: ID в Telegram
-        exp: Expiration — время истечения
-        iat: Issued At — время создания
+        exp: Expiration — время истечения (unix-время, сек)
+        iat: Issued At — время создания (unix-время, сек)
         type: Тип токена (access, refresh)
     """
     sub: str  # user_id как строка
     telegram_id: int
-    exp: datetime
-    iat: datetime
+    exp: int
+    iat: int
     type: str = "access"
 
 
@@ -112,20 +130,26 @@ def create_access_token(
     """
     # Определяем время жизни
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        ttl_seconds = int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
+        ttl_seconds = TOKEN_EXPIRE_SECONDS
+    
+    # Время — целые unix-секунды, как в RFC 7519
+    now = int(time.time())
     
     # Формируем payload
     payload = {
         "sub": str(user_id),  # Subject — ID пользователя
         "telegram_id": telegram_id,
-        "exp": expire,
-        "iat": datetime.utcnow(),
+        "exp": now + ttl_seconds,
+        "iat": now,
         "type": "access"
     }
     
     # Создаём токен
+    if _HMAC_TEMPLATE is not None:
+        return _fast_encode(payload)
+    
     token = jwt.encode(
         payload,
         settings.JWT_SECRET,
@@ -155,12 +179,11 @@ def create_token_response(user_id: int, telegram_id: int) -> TokenResponse:
         # }
     """
     token = create_access_token(user_id, telegram_id)
-    expires_in = settings.JWT_EXPIRE_HOURS * 3600  # В секундах
     
     return TokenResponse(
         access_token=token,
         token_type="bearer",
-        expires_in=expires_in
+        expires_in=TOKEN_EXPIRE_SECONDS
     )
 
 
@@ -168,10 +191,19 @@ def create_token_response(user_id: int, telegram_id: int) -> TokenResponse:
 # ВЕРИФИКАЦИЯ ТОКЕНА
 # ============================================================
 
+# token -> (payload, момент устаревания записи по time.monotonic())
+_token_cache: "OrderedDict[str, Tuple[TokenPayload, float]]" = OrderedDict()
+
+
 def verify_token(token: str) -> Optional[TokenPayload]:
     """
     Проверить и декодировать JWT токен.
     
+    Успешно проверенные токены кэшируются на TOKEN_CACHE_TTL секунд,
+    но не дольше срока действия токена (exp): клиент шлёт один и тот же
+    токен во многих запросах подряд, а результат проверки зависит только
+    от самого токена. Истёкший токен, как и без кэша, даёт None.
+    
     Параметры:
         token: JWT токен
     
@@ -185,13 +217,118 @@ def verify_token(token: str) -> Optional[TokenPayload]:
         else:
             print("Токен невалиден")
     """
+    cached = _token_cache.get(token)
+    if cached:
+        if cached[1] > time.monotonic():
+            _token_cache.move_to_end(token)
+            return cached[0]
+        # Запись устарела (TTL или exp) — проверяем токен заново
+        del _token_cache[token]
+    
+    payload = _decode_token(token)
+    
+    if payload is not None:
+        # Запись живёт TOKEN_CACHE_TTL, но не дольше самого токена
+        lifetime = min(TOKEN_CACHE_TTL, payload.exp - time.time())
+        if lifetime > 0:
+            _token_cache[token] = (payload, time.monotonic() + lifetime)
+            _token_cache.move_to_end(token)
+            if len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    
+    return payload
+
+
+# Быстрая проверка HS256 без JWT-библиотеки.
+# HMAC-объект с уже заданным ключом копируется на каждый токен
+# вместо повторной инициализации ключа.
+if settings.JWT_ALGORITHM == "HS256":
+    _HMAC_TEMPLATE = hmac.new(settings.JWT_SECRET.encode(), digestmod=hashlib.sha256)
+    # Заголовок, который PyJWT ставит в наши токены: base64url({"alg":"HS256","typ":"JWT"})
+    _HS256_HEADER = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9."
+else:
+    _HMAC_TEMPLATE = None
+    _HS256_HEADER = None
+
+
+def _b64url_decode(segment: str) -> bytes:
+    """Base64url без паддинга → bytes."""
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64url_encode(data: bytes) -> str:
+    """bytes → base64url без паддинга."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _fast_encode(payload: dict) -> str:
+    """
+    Подписать HS256-токен без JWT-библиотеки.
+    
+    Тот же формат, что у jwt.encode: заголовок _HS256_HEADER,
+    компактный JSON payload (orjson) и подпись шаблоном HMAC.
+    """
+    signing_input = _HS256_HEADER + _b64url_encode(orjson.dumps(payload))
+    
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(signing_input.encode())
+    
+    return f"{signing_input}.{_b64url_encode(mac.digest())}"
+
+
+def _fast_verify(token: str) -> dict:
+    """
+    Проверить HS256-токен с нашим стандартным заголовком.
+    
+    Повторяет проверки jwt.decode для наших токенов: подпись,
+    exp и iat. Ошибки — те же исключения PyJWT.
+    
+    Возвращает:
+        dict: payload токена
+    """
+    signing_input, _, signature_b64 = token.rpartition(".")
+    payload_b64 = signing_input[len(_HS256_HEADER):]
+    
     try:
-        # Декодируем токен
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
+        signature = _b64url_decode(signature_b64)
+        payload_json = _b64url_decode(payload_b64)
+    except (binascii.Error, ValueError):
+        raise jwt.DecodeError("Invalid token padding")
+    
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(signing_input.encode())
+    if not hmac.compare_digest(mac.digest(), signature):
+        raise jwt.InvalidSignatureError("Signature verification failed")
+    
+    try:
+        payload = orjson.loads(payload_json)
+    except ValueError:
+        raise jwt.DecodeError("Invalid payload string")
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid payload string: must be a json object")
+    
+    now = time.time()
+    if "exp" in payload and int(payload["exp"]) <= now:
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    if "iat" in payload and int(payload["iat"]) > now:
+        raise jwt.ImmatureSignatureError("The token is not yet valid (iat)")
+    
+    return payload
+
+
+def _decode_token(token: str) -> Optional[TokenPayload]:
+    """Декодировать и проверить подпись JWT токена (без кэша)."""
+    try:
+        # Декодируем токен: свои HS256-токены — быстрым путём,
+        # всё остальное — через библиотеку
+        if _HMAC_TEMPLATE is not None and token.startswith(_HS256_HEADER):
+            payload = _fast_verify(token)
+        else:
+            payload = jwt.decode(
+                token,
+                settings.JWT_SECRET,
+                algorithms=[settings.JWT_ALGORITHM]
+            )
         
         # Проверяем обязательные поля
         if "sub" not in payload:
@@ -201,17 +338,18 @@ def verify_token(token: str) -> Optional[TokenPayload]:
         return TokenPayload(
             sub=payload["sub"],
             telegram_id=payload.get("telegram_id", 0),
-            exp=datetime.fromtimestamp(payload["exp"]),
-            iat=datetime.fromtimestamp(payload["iat"]),
+            exp=payload["exp"],
+            iat=payload["iat"],
             type=payload.get("type", "access")
         )
         
-    except JWTError as e:
-        # Токен невалиден или истёк
-        print(f"JWT Error: {e}")
+    except jwt.PyJWTError as e:
+        # Токен невалиден или истёк. Без print: при переборе токенов
+        # вывод в stdout на каждый запрос сам становится нагрузкой
+        logger.debug("JWT Error: %s", e)
         return None
     except Exception as e:
-        print(f"Token verification error: {e}")
+        logger.debug("Token verification error: %s", e)
         return None
 
 
@@ -225,15 +363,59 @@ def is_token_expired(payload: TokenPayload) -> bool:
     Возвращает:
         bool: True если токен истёк
     """
-    return datetime.utcnow() > payload.exp
+    return int(time.time()) > payload.exp
 
 
 # ============================================================
 # DEPENDENCIES ДЛЯ FASTAPI
 # ============================================================
 
+# Признак, что токен в этом запросе ещё не декодировали
+_NOT_DECODED = object()
+
+
+def _bearer_token(request: Request) -> Optional[str]:
+    """
+    Токен из заголовка "Authorization: Bearer <token>".
+    
+    Читаем заголовок напрямую, без HTTPBearer — он строит
+    Pydantic-модель HTTPAuthorizationCredentials на каждый запрос.
+    """
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    
+    return token
+
+
+async def _decoded_token(request: Request) -> Optional[TokenPayload]:
+    """
+    Декодированный токен текущего запроса.
+    
+    Результат сохраняется в request.state, поэтому сколько бы
+    зависимостей ни читали токен, подпись проверяется один раз.
+    
+    Возвращает:
+        TokenPayload | None: Данные токена или None, если токена нет
+            или он невалиден
+    """
+    payload = getattr(request.state, "jwt_payload", _NOT_DECODED)
+    
+    if payload is _NOT_DECODED:
+        token = _bearer_token(request)
+        payload = verify_token(token) if token else None
+        request.state.jwt_payload = payload
+    
+    return payload
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    payload: Optional[TokenPayload] = Depends(_decoded_token)
 ) -> int:
     """
     FastAPI Dependency для получения текущего пользователя.
@@ -261,12 +443,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    # Получаем токен
-    token = credentials.credentials
-    
-    # Верифицируем токен
-    payload = verify_token(token)
-    
+    # Токен уже верифицирован в _decoded_token
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -287,7 +464,7 @@ async def get_current_user(
 
 
 async def get_current_user_optional(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    payload: Optional[TokenPayload] = Depends(_decoded_token)
 ) -> Optional[int]:
     """
     Опциональная версия get_current_user.
@@ -309,12 +486,6 @@ async def get_current_user_optional(
     Возвращает:
         int | None: ID пользователя или None
     """
-    if credentials is None:
-        return None
-    
-    token = credentials.credentials
-    payload = verify_token(token)
-    
     if payload is None or is_token_expired(payload):
         return None
     
@@ -322,7 +493,8 @@ async def get_current_user_optional(
 
 
 async def get_telegram_id(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    payload: Optional[TokenPayload] = Depends(_decoded_token)
 ) -> int:
     """
     Получить Telegram ID текущего пользователя.
@@ -341,8 +513,6 @@ async def get_telegram_id(
             detail="Требуется авторизация"
         )
     
-    payload = verify_token(credentials.credentials)
-    
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -394,12 +564,12 @@ def get_token_remaining_time(token: str) -> Optional[timedelta]:
     if payload is None:
         return None
     
-    remaining = payload.exp - datetime.utcnow()
+    remaining = payload.exp - time.time()
     
-    if remaining.total_seconds() < 0:
+    if remaining < 0:
         return None
     
-    return remaining
+    return timedelta(seconds=remaining)
 
 
 # ============================================================
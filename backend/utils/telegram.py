@@ -23,10 +23,13 @@
 
 import hashlib
 import hmac
-import json
+import logging
+import re
 import time
-from typing import Optional
-from urllib.parse import parse_qs, unquote
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote_plus, unquote_to_bytes
 
 from pydantic import BaseModel
 
@@ -34,6 +37,17 @@ import sys
 sys.path.append("..")
 from config import settings
 
+logger = logging.getLogger(__name__)
+
+
+# Кэш успешно проверенных initData: время жизни записи (сек) и размер LRU
+INIT_DATA_CACHE_TTL = 300
+INIT_DATA_CACHE_SIZE = 4096
+
+# Максимальная длина initData. Настоящие initData — единицы КБ;
+# более длинные строки отбрасываем до разбора и HMAC
+INIT_DATA_MAX_LENGTH = 8192
+
 
 # ============================================================
 # МОДЕЛИ ДАННЫХ
@@ -85,6 +99,45 @@ class TelegramInitData(BaseModel):
 # ВАЛИДАЦИЯ INITDATA
 # ============================================================
 
+@lru_cache(maxsize=4)
+def _derive_secret_key(bot_token: str) -> bytes:
+    """
+    secret_key = HMAC-SHA256("WebAppData", bot_token).
+    
+    Зависит только от токена бота, поэтому считается один раз
+    на процесс, а не на каждую проверку initData.
+    """
+    return hmac.digest(b"WebAppData", bot_token.encode("utf-8"), "sha256")
+
+
+@lru_cache(maxsize=4)
+def _derive_hmac_pads(bot_token: str) -> Tuple["hashlib._Hash", "hashlib._Hash"]:
+    """
+    Состояния SHA-256 после блоков ipad и opad для HMAC с secret_key.
+    
+    HMAC(K, m) = H((K ^ opad) || H((K ^ ipad) || m)). Ключ фиксирован,
+    поэтому оба первых блока хэшируем один раз, а на каждую проверку
+    только копируем готовые состояния (.copy() — копия в C).
+    """
+    key = _derive_secret_key(bot_token).ljust(64, b"\0")
+    
+    inner = hashlib.sha256(bytes(byte ^ 0x36 for byte in key))
+    outer = hashlib.sha256(bytes(byte ^ 0x5C for byte in key))
+    
+    return inner, outer
+
+
+# Известные поля initData (кроме hash) — уже в алфавитном порядке
+_INIT_DATA_FIELDS = (
+    "auth_date", "can_send_after", "chat", "chat_instance", "chat_type",
+    "query_id", "receiver", "signature", "start_param", "user"
+)
+
+
+# (init_data, bot_token) -> момент устаревания записи по time.monotonic()
+_init_data_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+
 def validate_telegram_init_data(init_data: str, bot_token: str = None) -> bool:
     """
     Проверить подпись initData от Telegram.
@@ -92,6 +145,10 @@ def validate_telegram_init_data(init_data: str, bot_token: str = None) -> bool:
     Telegram подписывает данные с помощью HMAC-SHA256.
     Мы проверяем, что данные не были подделаны.
     
+    Верные initData кэшируются на INIT_DATA_CACHE_TTL секунд: фронтенд
+    присылает одну и ту же строку во всех запросах сессии, а подписанная
+    строка не меняется. Возраст данных проверяет is_init_data_expired.
+    
     Параметры:
         init_data: Строка initData от Telegram WebApp
         bot_token: Токен бота (если None — берётся из настроек)
@@ -117,55 +174,120 @@ def validate_telegram_init_data(init_data: str, bot_token: str = None) -> bool:
             # Данные подделаны!
             raise HTTPException(401, "Invalid Telegram data")
     """
-    if not init_data:
+    if not init_data or len(init_data) > INIT_DATA_MAX_LENGTH:
         return False
     
     # Используем токен из настроек, если не передан
     if bot_token is None:
         bot_token = settings.TELEGRAM_BOT_TOKEN
     
+    cache_key = (init_data, bot_token)
+    expires_at = _init_data_cache.get(cache_key)
+    if expires_at and expires_at > time.monotonic():
+        _init_data_cache.move_to_end(cache_key)
+        return True
+    
+    is_valid = _check_init_data(init_data, _derive_hmac_pads(bot_token))
+    
+    if is_valid:
+        _init_data_cache[cache_key] = time.monotonic() + INIT_DATA_CACHE_TTL
+        _init_data_cache.move_to_end(cache_key)
+        if len(_init_data_cache) > INIT_DATA_CACHE_SIZE:
+            _init_data_cache.popitem(last=False)
+    
+    return is_valid
+
+
+def validate_telegram_init_data_batch(
+    init_datas: List[str],
+    bot_token: str = None
+) -> List[bool]:
+    """
+    Проверить подписи сразу нескольких initData.
+    
+    Токен и ключи HMAC определяются один раз на всю пачку,
+    дальше для каждой строки — только разбор и один HMAC.
+    
+    Параметры:
+        init_datas: Список строк initData
+        bot_token: Токен бота (если None — берётся из настроек)
+    
+    Возвращает:
+        List[bool]: Результат проверки для каждой строки, в том же порядке
+    """
+    if bot_token is None:
+        bot_token = settings.TELEGRAM_BOT_TOKEN
+    
+    pads = _derive_hmac_pads(bot_token)
+    
+    return [
+        bool(init_data)
+        and len(init_data) <= INIT_DATA_MAX_LENGTH
+        and _check_init_data(init_data, pads)
+        for init_data in init_datas
+    ]
+
+
+def _check_init_data(
+    init_data: str,
+    pads: Tuple["hashlib._Hash", "hashlib._Hash"]
+) -> bool:
+    """Проверка подписи initData готовыми состояниями HMAC (см. _derive_hmac_pads)."""
     try:
-        # Парсим query string
-        parsed_data = parse_qs(init_data, keep_blank_values=True)
+        # Парсим query string за один проход, без списков на каждое значение
+        # (как parse_qs: при повторе ключа берётся первое значение).
+        # Значения пока не декодируем — см. data_check_bytes ниже
+        params = {}
+        for part in init_data.split("&"):
+            if not part:
+                continue
+            key, _, value = part.partition("=")
+            key = unquote_plus(key)
+            if key not in params:
+                params[key] = value
         
         # Извлекаем hash (он не участвует в проверке)
-        received_hash = parsed_data.get("hash", [None])[0]
+        received_hash = params.pop("hash", None)
         if not received_hash:
             return False
+        received_hash = unquote_plus(received_hash)
         
-        # Собираем остальные параметры
-        data_check_parts = []
-        for key, values in sorted(parsed_data.items()):
-            if key == "hash":
-                continue
-            # Берём первое значение каждого параметра
-            value = values[0] if values else ""
-            data_check_parts.append(f"{key}={value}")
+        # Сравниваем сырые 32 байта, а не 64 hex-символа
+        try:
+            received_digest = bytes.fromhex(received_hash)
+        except ValueError:
+            return False
+        
+        # Остальные параметры по алфавиту.
+        # Обычно все поля известные — берём их в готовом порядке без сортировки
+        keys = [key for key in _INIT_DATA_FIELDS if key in params]
+        if len(keys) != len(params):
+            # Есть незнакомые поля (Telegram мог добавить новые) — сортируем всё
+            keys = sorted(params)
+        
+        # Строка для проверки "key=value\nkey=value..." собирается сразу в байтах:
+        # значения декодируются из %XX прямо в bytes ("+" → пробел, как в parse_qs),
+        # без промежуточных str и итогового .encode()
+        data_check_bytes = b"\n".join(
+            key.encode("utf-8") + b"=" + unquote_to_bytes(params[key].replace("+", " "))
+            for key in keys
+        )
         
-        # Формируем строку для проверки
-        data_check_string = "\n".join(data_check_parts)
+        # Вычисляем hash = HMAC-SHA256(secret_key, data_check_string)
+        inner_pad, outer_pad = pads
         
-        # Создаём secret key
-        # secret_key = HMAC-SHA256("WebAppData", bot_token)
-        secret_key = hmac.new(
-            key=b"WebAppData",
-            msg=bot_token.encode("utf-8"),
-            digestmod=hashlib.sha256
-        ).digest()
+        inner = inner_pad.copy()
+        inner.update(data_check_bytes)
         
-        # Вычисляем hash
-        calculated_hash = hmac.new(
-            key=secret_key,
-            msg=data_check_string.encode("utf-8"),
-            digestmod=hashlib.sha256
-        ).hexdigest()
+        outer = outer_pad.copy()
+        outer.update(inner.digest())
         
         # Сравниваем (безопасное сравнение для защиты от timing attack)
-        return hmac.compare_digest(calculated_hash, received_hash)
+        return hmac.compare_digest(outer.digest(), received_digest)
         
     except Exception as e:
         # При любой ошибке парсинга — данные невалидны
-        print(f"Ошибка валидации initData: {e}")
+        logger.debug("Ошибка валидации initData: %s", e)
         return False
 
 
@@ -187,24 +309,58 @@ def is_init_data_expired(init_data: str, max_age_seconds: int = 86400) -> bool:
         if is_init_data_expired(init_data):
             raise HTTPException(401, "Session expired")
     """
+    if not init_data or len(init_data) > INIT_DATA_MAX_LENGTH:
+        return True
+    
+    # Нужно одно поле — ищем его прямо в строке, без разбора всего initData
+    if init_data.startswith("auth_date="):
+        start = 10
+    else:
+        start = init_data.find("&auth_date=")
+        if start < 0:
+            return True  # Нет auth_date — считаем устаревшими
+        start += 11
+    
+    end = init_data.find("&", start)
+    
     try:
-        parsed_data = parse_qs(init_data)
-        auth_date = int(parsed_data.get("auth_date", [0])[0])
-        
-        current_time = int(time.time())
-        age = current_time - auth_date
-        
-        return age > max_age_seconds
-        
-    except Exception:
+        auth_date = int(init_data[start:end] if end >= 0 else init_data[start:])
+    except ValueError:
         return True  # При ошибке считаем устаревшими
+    
+    current_time = int(time.time())
+    age = current_time - auth_date
+    
+    return age > max_age_seconds
 
 
 # ============================================================
 # ПАРСИНГ ДАННЫХ ПОЛЬЗОВАТЕЛЯ
 # ============================================================
 
-def parse_telegram_user(init_data: str) -> Optional[TelegramUser]:
+@lru_cache(maxsize=1024)
+def _parse_init_data(init_data: str) -> dict:
+    """
+    initData как плоский dict {ключ: значение} с кэшем.
+    
+    Фронтенд присылает одну и ту же строку initData весь сеанс,
+    поэтому повторные разборы берутся из кэша.
+    Результат общий — изменять его нельзя.
+    """
+    # parse_qsl вместо parse_qs: без списка на каждое значение.
+    # Как в parse_qs, при повторе ключа остаётся первое значение
+    parsed_data = {}
+    for key, value in parse_qsl(init_data, keep_blank_values=True):
+        parsed_data.setdefault(key, value)
+    
+    return parsed_data
+
+
+def parse_telegram_user(
+    init_data: str = None,
+    *,
+    parsed_data: dict = None
+) -> Optional[TelegramUser]:
     """
     Извлечь данные пользователя из initData.
     
@@ -213,6 +369,8 @@ def parse_telegram_user(init_data: str) -> Optional[TelegramUser]:
     
     Параметры:
         init_data: Строка initData от Telegram
+        parsed_data: Уже распарсенный initData (результат _parse_init_data),
+                     чтобы не разбирать строку повторно
     
     Возвращает:
         TelegramUser | None: Данные пользователя или None при ошибке
@@ -224,25 +382,26 @@ def parse_telegram_user(init_data: str) -> Optional[TelegramUser]:
             print(f"Привет, {user.first_name}!")
     """
     try:
-        # Парсим query string
-        parsed_data = parse_qs(init_data, keep_blank_values=True)
+        # Парсим query string (если ещё не распарсен)
+        if parsed_data is None:
+            if len(init_data) > INIT_DATA_MAX_LENGTH:
+                return None
+            parsed_data = _parse_init_data(init_data)
         
         # Получаем JSON строку с данными пользователя
-        user_json = parsed_data.get("user", [None])[0]
+        user_json = parsed_data.get("user")
         if not user_json:
             return None
         
-        # Декодируем URL-encoded JSON
-        user_json = unquote(user_json)
-        
-        # Парсим JSON
-        user_data = json.loads(user_json)
+        # Декодируем URL-encoded JSON сразу в байты
+        user_json = unquote_to_bytes(user_json)
         
-        # Создаём объект TelegramUser
-        return TelegramUser(**user_data)
+        # Парсим JSON и создаём TelegramUser за один проход в pydantic-core,
+        # без промежуточного dict
+        return TelegramUser.model_validate_json(user_json)
         
     except Exception as e:
-        print(f"Ошибка парсинга user из initData: {e}")
+        logger.debug("Ошибка парсинга user из initData: %s", e)
         return None
 
 
@@ -267,24 +426,29 @@ def parse_telegram_init_data(init_data: str) -> Optional[TelegramInitData]:
                 print(f"Start param: {data.start_param}")
     """
     try:
-        parsed_data = parse_qs(init_data, keep_blank_values=True)
+        if len(init_data) > INIT_DATA_MAX_LENGTH:
+            return None
         
-        # Парсим пользователя
-        user = parse_telegram_user(init_data)
+        parsed_data = _parse_init_data(init_data)
+        
+        # Парсим пользователя из того же разбора
+        user = parse_telegram_user(parsed_data=parsed_data)
         if not user:
             return None
         
-        # Собираем остальные данные
-        return TelegramInitData(
+        # Собираем остальные данные.
+        # Поля уже нужных типов (user провалидирован, auth_date — int),
+        # поэтому повторную валидацию pydantic пропускаем
+        return TelegramInitData.model_construct(
             user=user,
-            auth_date=int(parsed_data.get("auth_date", [0])[0]),
-            query_id=parsed_data.get("query_id", [None])[0],
-            hash=parsed_data.get("hash", [""])[0],
-            start_param=parsed_data.get("start_param", [None])[0]
+            auth_date=int(parsed_data.get("auth_date", 0)),
+            query_id=parsed_data.get("query_id"),
+            hash=parsed_data.get("hash", ""),
+            start_param=parsed_data.get("start_param")
         )
         
     except Exception as e:
-        print(f"Ошибка парсинга initData: {e}")
+        logger.debug("Ошибка парсинга initData: %s", e)
         return None
 
 
@@ -292,6 +456,22 @@ def parse_telegram_init_data(init_data: str) -> Optional[TelegramInitData]:
 # DEEP LINKS
 # ============================================================
 
+# Канонический start_param: "g_{group_id}", "r_{referrer_id}" или "g_{group_id}_r_{referrer_id}",
+# опционально с подписью "_s_{signature}" (см. generate_share_link)
+_START_PARAM_RE = re.compile(r"(?:g_(?P<g>\d+))?(?:(?:^|_)r_(?P<r>\d+))?(?:_s_[0-9a-f]+)?")
+
+# Ключ подписи ссылок для шеринга (BLAKE2b в keyed-режиме).
+# Выводится из JWT_SECRET с отдельным person, чтобы не совпадать с ключом JWT
+_SHARE_LINK_KEY = hashlib.blake2b(
+    settings.JWT_SECRET.encode("utf-8"),
+    digest_size=32,
+    person=b"share-link"
+).digest()
+
+# Длина подписи в байтах (в ссылке — вдвое больше hex-символов)
+SHARE_SIGNATURE_SIZE = 6
+
+
 def generate_start_link(bot_username: str, start_param: str) -> str:
     """
     Сгенерировать deep link для бота.
@@ -330,12 +510,10 @@ def generate_webapp_link(bot_username: str, start_param: str = None) -> str:
         link = generate_webapp_link("MyGroupBuyBot", "g_42_r_123")
         # https://t.me/MyGroupBuyBot/app?startapp=g_42_r_123
     """
-    base_url = f"https://t.me/{bot_username}/app"
-    
     if start_param:
-        return f"{base_url}?startapp={start_param}"
+        return f"https://t.me/{bot_username}/app?startapp={start_param}"
     
-    return base_url
+    return f"https://t.me/{bot_username}/app"
 
 
 def parse_start_param(start_param: str) -> dict:
@@ -368,6 +546,16 @@ def parse_start_param(start_param: str) -> dict:
     if not start_param:
         return result
     
+    # Быстрый путь: ссылки, которые генерируем мы сами, разбираются одним regex
+    match = _START_PARAM_RE.fullmatch(start_param)
+    if match:
+        group_id, referrer_id = match.group("g", "r")
+        if group_id:
+            result["group_id"] = int(group_id)
+        if referrer_id:
+            result["referrer_id"] = int(referrer_id)
+        return result
+    
     parts = start_param.split("_")
     
     # Парсим по частям
@@ -391,7 +579,48 @@ def parse_start_param(start_param: str) -> dict:
     return result
 
 
-def generate_share_link(group_id: int, referrer_id: int, bot_username: str) -> str:
+def parse_start_params_batch(start_params: List[str]) -> List[dict]:
+    """
+    Распарсить сразу много параметров из deep link.
+    
+    Канонические значения разбираются регулярным выражением прямо
+    в цикле, остальные — через parse_start_param.
+    
+    Параметры:
+        start_params: Список параметров из deep link
+    
+    Возвращает:
+        List[dict]: Результаты в том же формате и порядке, что parse_start_param
+    
+    Пример:
+        parse_start_params_batch(["g_42_r_123", "g_42"])
+        # [{"group_id": 42, "referrer_id": 123, ...}, {"group_id": 42, "referrer_id": None, ...}]
+    """
+    fullmatch = _START_PARAM_RE.fullmatch
+    results = []
+    
+    for start_param in start_params:
+        match = fullmatch(start_param) if start_param else None
+        if match is None:
+            results.append(parse_start_param(start_param))
+            continue
+        
+        group_id, referrer_id = match.group("g", "r")
+        results.append({
+            "group_id": int(group_id) if group_id else None,
+            "referrer_id": int(referrer_id) if referrer_id else None,
+            "raw": start_param
+        })
+    
+    return results
+
+
+def generate_share_link(
+    group_id: int,
+    referrer_id: int,
+    bot_username: str,
+    signed: bool = False
+) -> str:
     """
     Сгенерировать ссылку для шеринга сбора.
     
@@ -399,6 +628,8 @@ def generate_share_link(group_id: int, referrer_id: int, bot_username: str) -> s
         group_id: ID сбора
         referrer_id: ID пользователя, который делится
         bot_username: Username бота
+        signed: Добавить подпись "_s_{signature}", чтобы referrer_id
+                нельзя было подменить (проверка — verify_share_param)
     
     Возвращает:
         str: Ссылка для шеринга
@@ -406,9 +637,59 @@ def generate_share_link(group_id: int, referrer_id: int, bot_username: str) -> s
     Пример:
         link = generate_share_link(42, 123, "MyGroupBuyBot")
         # https://t.me/MyGroupBuyBot/app?startapp=g_42_r_123
+        
+        link = generate_share_link(42, 123, "MyGroupBuyBot", signed=True)
+        # https://t.me/MyGroupBuyBot/app?startapp=g_42_r_123_s_1a2b3c4d5e6f
+    """
+    if signed:
+        start_param = f"g_{group_id}_r_{referrer_id}"
+        return (
+            f"https://t.me/{bot_username}/app?startapp="
+            f"{start_param}_s_{_sign_share_param(start_param).hex()}"
+        )
+    
+    # Та же ссылка, что generate_webapp_link(bot_username, "g_..._r_..."),
+    # но одной f-строкой: без промежуточного start_param и лишнего вызова
+    return f"https://t.me/{bot_username}/app?startapp=g_{group_id}_r_{referrer_id}"
+
+
+def verify_share_param(start_param: str) -> bool:
+    """
+    Проверить подпись параметра из ссылки generate_share_link(..., signed=True).
+    
+    Параметры:
+        start_param: Параметр из deep link
+    
+    Возвращает:
+        bool: True если подпись есть и верна
+    
+    Пример:
+        if verify_share_param(request.start_param):
+            referrer_id = parse_start_param(request.start_param)["referrer_id"]
     """
-    start_param = f"g_{group_id}_r_{referrer_id}"
-    return generate_webapp_link(bot_username, start_param)
+    if not start_param:
+        return False
+    
+    payload, separator, signature = start_param.rpartition("_s_")
+    if not separator:
+        return False
+    
+    try:
+        received = bytes.fromhex(signature)
+    except ValueError:
+        return False
+    
+    # Сравнение за постоянное время (защита от timing attack)
+    return hmac.compare_digest(_sign_share_param(payload), received)
+
+
+def _sign_share_param(payload: str) -> bytes:
+    """Подпись start_param: keyed BLAKE2b — один проход вместо двух SHA-256 у HMAC."""
+    return hashlib.blake2b(
+        payload.encode("utf-8"),
+        key=_SHARE_LINK_KEY,
+        digest_size=SHARE_SIGNATURE_SIZE
+    ).digest()
 
 
 # ============================================================